@@ -1,3 +1,4 @@
 
 VERSION = (0, 1, 0)
-__version__ = '.'.join(map(str, VERSION))
\ No newline at end of file
+__version__ = '.'.join(map(str, VERSION))
+default_app_config = 'multiplefilefield.apps.MultipleFileFieldConfig'
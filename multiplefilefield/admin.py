@@ -0,0 +1,120 @@
+import hashlib
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import caches
+from django.db.models.signals import post_save
+from django.utils import six
+from django.utils.encoding import force_bytes
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from django.utils.translation import ungettext
+
+from multiplefilefield.fields import MultipleFileModelField
+from multiplefilefield.widgets import MultipleFileInput
+
+
+def get_cache():
+    return caches[getattr(settings, 'MULTIPLEFILEFIELD_SUMMARY_CACHE', 'default')]
+
+
+def get_raw_value(instance, field):
+    """
+    Returns the database value of field, without decoding it if the instance
+    was just fetched.
+    """
+    value = instance.__dict__.get(field.attname)
+    if isinstance(value, six.string_types):
+        return value
+    return field.get_prep_value(value) if value else ''
+
+
+def summary_cache_key(field, raw_value, links):
+    return 'multiplefilefield.summary.%s.%s.%s.%d.%s' % (
+        field.model._meta.app_label, field.model._meta.model_name, field.name, links,
+        hashlib.md5(force_bytes(raw_value)).hexdigest())
+
+
+def render_file_summary(instance, field, links=True):
+    """
+    Returns the count of the files of field, followed by links to them,
+    cached on the database value.
+    """
+    raw_value = get_raw_value(instance, field)
+    key = summary_cache_key(field, raw_value, links)
+    html = get_cache().get(key)
+    if html is None:
+        names = field.get_names(raw_value)
+        html = ungettext('%(count)d file', '%(count)d files', len(names)) % {'count': len(names)}
+        if links and names:
+            html = format_html('{}<br/>{}', html, format_html_join(
+                mark_safe('<br/>'), '<a href="{}">{}</a>',
+                ((field.storage.url(name), os.path.basename(name)) for name in names)))
+        get_cache().set(key, six.text_type(html))
+    return mark_safe(html)
+
+
+def invalidate_file_summaries(sender, instance, update_fields=None, **kwargs):
+    """
+    post_save receiver dropping the cached summaries of instance, connected
+    to the models with MultipleFileModelFields by connect_file_summaries().
+
+    The summaries are keyed on the database value, so a changed value never
+    hits a stale summary; this only matters when the urls of an unchanged
+    value change, e.g. after a storage moved the files.
+    """
+    keys = []
+    for field in sender._meta.fields:
+        if isinstance(field, MultipleFileModelField):
+            if update_fields is not None and field.name not in update_fields:
+                continue
+            raw_value = field.get_saved_value(instance)
+            if raw_value is not None:
+                keys.extend(summary_cache_key(field, raw_value, links) for links in (True, False))
+    if keys:
+        get_cache().delete_many(keys)
+
+
+def connect_file_summaries():
+    """
+    Connects invalidate_file_summaries() to every model with
+    MultipleFileModelFields, from the AppConfig of multiplefilefield.
+    """
+    for model in apps.get_models():
+        if any(isinstance(field, MultipleFileModelField) for field in model._meta.fields):
+            post_save.connect(invalidate_file_summaries, sender=model,
+                              dispatch_uid='multiplefilefield.summary.%s.%s' % (
+                                  model._meta.app_label, model._meta.model_name))
+
+
+def file_summary(field_name, short_description=None, links=True):
+    """
+    Returns a list_display callable rendering the files of field_name from
+    a cached summary, rather than decoding the field for every row:
+
+        list_display = ('hash', file_summary('files'))
+
+    The summaries of an instance are dropped whenever it is saved, see
+    invalidate_file_summaries().
+    """
+    def summary(instance):
+        return render_file_summary(instance, instance._meta.get_field(field_name), links)
+    summary.short_description = short_description or field_name.replace('_', ' ')
+    summary.allow_tags = True
+    summary.__name__ = str('%s_summary' % field_name)
+    return summary
+
+
+class MultipleFileModelAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin rendering the MultipleFileModelFields of the change form as a
+    count of files, without links, when file_links is False.
+    """
+    file_links = True
+
+    def formfield_for_dbfield(self, db_field, **kwargs):
+        if isinstance(db_field, MultipleFileModelField) and not self.file_links:
+            kwargs.setdefault('widget', MultipleFileInput(links=False))
+        return super(MultipleFileModelAdmin, self).formfield_for_dbfield(db_field, **kwargs)
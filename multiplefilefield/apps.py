@@ -0,0 +1,11 @@
+from django.apps import AppConfig, apps
+
+
+class MultipleFileFieldConfig(AppConfig):
+    name = 'multiplefilefield'
+    verbose_name = "Multiple file field"
+
+    def ready(self):
+        if apps.is_installed('django.contrib.admin'):
+            from multiplefilefield.admin import connect_file_summaries
+            connect_file_summaries()
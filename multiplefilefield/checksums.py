@@ -0,0 +1,82 @@
+import hashlib
+
+from django.core.files.base import File
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+XXHASH_ALGORITHMS = ('xxh32', 'xxh64', 'xxh3_64', 'xxh3_128', 'xxh128')
+
+
+def is_supported(algorithm):
+    if algorithm in XXHASH_ALGORITHMS:
+        return xxhash is not None and hasattr(xxhash, algorithm)
+    try:
+        hashlib.new(algorithm)
+    except ValueError:
+        return False
+    return True
+
+
+def new_hasher(algorithm):
+    if algorithm in XXHASH_ALGORITHMS:
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
+def format_checksum(algorithm, hasher):
+    # The algorithm is kept with the digest, so that files stay verifiable
+    # after the field's checksum argument changes
+    return '%s:%s' % (algorithm, hasher.hexdigest())
+
+
+def compute_checksum(_file, algorithm):
+    hasher = new_hasher(algorithm)
+    for chunk in _file.chunks():
+        hasher.update(chunk)
+    return format_checksum(algorithm, hasher)
+
+
+def verify_checksum(_file, checksum):
+    """
+    Returns whether the content of _file matches checksum, as recorded by
+    HashingFile.checksum.
+    """
+    algorithm = checksum.split(':', 1)[0]
+    return compute_checksum(_file, algorithm) == checksum
+
+
+class HashingFile(File):
+    """
+    Wraps the content being saved and hashes the bytes the storage reads from
+    it, through chunks() or read(), so the checksum comes out of the same
+    pass that writes the file. Bytes read again after a seek are only hashed
+    once.
+    """
+    def __init__(self, content, algorithm):
+        super(HashingFile, self).__init__(content, content.name)
+        self.algorithm = algorithm
+        self._hasher = new_hasher(algorithm)
+        # Length of the beginning of the file hashed so far
+        self._hashed = 0
+
+    def read(self, *args, **kwargs):
+        try:
+            start = self.file.tell()
+        except (AttributeError, IOError, ValueError):
+            start = None
+        data = self.file.read(*args, **kwargs)
+        if start is not None and start <= self._hashed < start + len(data):
+            self._hasher.update(data[self._hashed - start:])
+            self._hashed = start + len(data)
+        return data
+
+    @property
+    def checksum(self):
+        if self._hashed != self.size:
+            # The storage did not read the whole file through this wrapper,
+            # hash it separately
+            return compute_checksum(self.file, self.algorithm)
+        return format_checksum(self.algorithm, self._hasher)
@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+
+from django.db import connections, router, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.migrations.operations.base import Operation
+
+from multiplefilefield.fields import load_entries, parse_legacy_value
+
+
+def convert_value(field, value):
+    """
+    Returns value converted from the legacy format to the structured one, or
+    None if it needs no conversion.
+    """
+    if not value or load_entries(value) is not None:
+        return None
+    return field.get_prep_value(parse_legacy_value(value))
+
+
+def convert_legacy_values(model, fields, batch_size=1000, start_after=None, sleep=0, using=None):
+    """
+    Converts the legacy values of fields of model to the structured format.
+
+    Rows are walked by primary key (keyset pagination), batch_size at a time,
+    each batch written by a single UPDATE ... CASE statement, so it can run
+    on a live table. A value is only updated if it did not change since it
+    was read. Yields (last primary key, number of converted rows) after every
+    batch; pass that primary key as start_after to resume. sleep is the pause
+    in seconds between batches, to throttle the load on the database.
+    """
+    using = using or router.db_for_write(model)
+    pk_name = model._meta.pk.name
+    manager = model._default_manager.using(using)
+    queryset = manager.order_by(pk_name).values_list(pk_name, *[field.attname for field in fields])
+
+    while True:
+        if start_after is not None:
+            rows = list(queryset.filter(**{pk_name + '__gt': start_after})[:batch_size])
+        else:
+            rows = list(queryset[:batch_size])
+        if not rows:
+            return
+
+        conversions = []
+        for row in rows:
+            for field, value in zip(fields, row[1:]):
+                new_value = convert_value(field, value)
+                if new_value is not None:
+                    conversions.append((row[0], field, value, new_value))
+
+        converted = 0
+        # Each conversion takes 5 parameters, which SQLite limits per query
+        chunk_size = connections[using].ops.bulk_batch_size([None] * 5, conversions) or 1
+        with transaction.atomic(using=using):
+            for i in range(0, len(conversions), chunk_size):
+                converted += update_values(manager, pk_name, conversions[i:i + chunk_size])
+        start_after = rows[-1][0]
+        yield start_after, converted
+
+        if len(rows) < batch_size:
+            return
+        if sleep:
+            time.sleep(sleep)
+
+
+def update_values(manager, pk_name, conversions):
+    """
+    Writes the (pk, field, old value, new value) conversions in a single
+    UPDATE, comparing each value with the old one before setting it. Returns
+    the number of updated rows.
+    """
+    whens = OrderedDict()
+    matches = Q()
+    for pk, field, value, new_value in conversions:
+        condition = Q(**{pk_name: pk, field.attname: value})
+        whens.setdefault(field.attname, []).append(When(condition, then=Value(new_value)))
+        matches |= condition
+    return manager.filter(matches).update(**dict(
+        (attname, Case(*attname_whens, default=F(attname))) for attname, attname_whens in whens.items()))
+
+
+class ConvertLegacyFileValues(Operation):
+    """
+    Data migration converting the legacy values of a model's
+    MultipleFileModelFields to the structured format:
+
+        operations = [
+            ConvertLegacyFileValues('SimpleMultipleFileFieldModel', ['files']),
+        ]
+
+    Migrations usually run in a single transaction; for large live tables run
+    the convert_legacy_file_values command first, this operation then only
+    walks the table to find nothing left to convert.
+    """
+    reduces_to_sql = False
+    # Earlier versions cannot read the structured format back
+    reversible = False
+
+    def __init__(self, model_name, field_names, batch_size=1000):
+        self.model_name = model_name
+        self.field_names = field_names
+        self.batch_size = batch_size
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        using = schema_editor.connection.alias
+        if router.allow_migrate(using, app_label):
+            model = from_state.apps.get_model(app_label, self.model_name)
+            fields = [model._meta.get_field(name) for name in self.field_names]
+            for _ in convert_legacy_values(model, fields, self.batch_size, using=using):
+                pass
+
+    def describe(self):
+        return "Convert legacy values of %s.%s" % (self.model_name, ', '.join(self.field_names))
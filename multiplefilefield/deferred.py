@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import LazyObject
+
+logger = logging.getLogger('multiplefilefield')
+
+_scopes = threading.local()
+
+# Suffix of the records of the staged files which failed to reach their storage
+FAILED_SUFFIX = '.failed'
+
+
+class DefaultStagingStorage(LazyObject):
+    def _setup(self):
+        location = os.path.join(settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir(), 'multiplefilefield')
+        self._wrapped = FileSystemStorage(location=location)
+
+
+default_staging_storage = DefaultStagingStorage()
+
+
+class StagedWrite(object):
+    """
+    A file written to the staging storage, waiting to be copied to its
+    final storage once the transaction commits.
+
+    label names the field, "app_label.Model.field", so that a failed write
+    can be retried by retry_staged_writes, see load().
+    """
+    def __init__(self, staging_storage, staged_name, storage, name, label=None):
+        self.staging_storage = staging_storage
+        self.staged_name = staged_name
+        self.storage = storage
+        self.name = name
+        self.label = label
+
+    @classmethod
+    def load(cls, staging_storage, record_name, storages):
+        """
+        Returns the failed write recorded in record_name, with its final
+        storage taken from storages, a dict of the storages by label.
+        """
+        with staging_storage.open(record_name, 'rb') as record:
+            data = json.loads(force_text(record.read()))
+        return cls(staging_storage, record_name[:-len(FAILED_SUFFIX)], storages[data['label']],
+                   data['name'], data['label'])
+
+    @property
+    def record_name(self):
+        return self.staged_name + FAILED_SUFFIX
+
+    def commit(self):
+        """Copies the staged file to its storage, returns whether it did."""
+        try:
+            with self.staging_storage.open(self.staged_name, 'rb') as content:
+                # The name was generated collision-free, see filename_strategy
+                name = self.storage._save(self.name, content)
+        except Exception:
+            logger.exception("Failed to write the staged file %s to %s.", self.staged_name, self.name)
+            self.record_failure()
+            return False
+        if name.replace('\\', '/') != self.name:
+            logger.warning("The staged file %s was written to %s instead of %s.", self.staged_name, name, self.name)
+        self.staging_storage.delete(self.staged_name)
+        self.staging_storage.delete(self.record_name)
+        return True
+
+    def record_failure(self):
+        """
+        Records the final name of the staged file next to it: the row already
+        refers to that name, so purge_staged_files keeps the file for
+        retry_staged_writes.
+        """
+        if self.staging_storage.exists(self.record_name):
+            return
+        record = json.dumps({'label': self.label, 'name': self.name})
+        try:
+            self.staging_storage._save(self.record_name, ContentFile(force_bytes(record)))
+        except Exception:
+            logger.exception("Failed to record the failed write of the staged file %s to %s.",
+                             self.staged_name, self.name)
+
+    def rollback(self):
+        self.staging_storage.delete(self.staged_name)
+
+
+def walk(storage, path=''):
+    """Yields the names of all the files of storage under path."""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        for name in walk(storage, os.path.join(path, directory)):
+            yield name
+
+
+def _get_scopes():
+    if not hasattr(_scopes, 'stack'):
+        _scopes.stack = []
+    return _scopes.stack
+
+
+def _commit_all(writes):
+    for write in writes:
+        write.commit()
+
+
+def stage_write(write, using=None):
+    """
+    Schedules write for when the current transaction commits.
+
+    Inside atomic_files(), staged files are deleted if the block rolls back.
+    Otherwise the write is registered with transaction.on_commit() (Django
+    1.9+) and a rolled back write leaves its staged file to
+    purge_staged_files; without on_commit() it happens right away.
+    """
+    scopes = _get_scopes()
+    if scopes:
+        scopes[-1].append(write)
+    elif hasattr(transaction, 'on_commit'):
+        transaction.on_commit(write.commit, using=using)
+    else:
+        write.commit()
+
+
+@contextmanager
+def atomic_files(using=None):
+    """
+    transaction.atomic() which writes the files saved in the block with
+    deferred_writes to their storages once the transaction commits, and
+    deletes them from the staging storage if it rolls back.
+
+    Without transaction.on_commit() (Django 1.8), the outermost block writes
+    the files when it exits, so it cannot be nested in transaction.atomic().
+    """
+    scopes = _get_scopes()
+    if not scopes and not hasattr(transaction, 'on_commit') and \
+            transaction.get_connection(using).in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "atomic_files() cannot be nested in transaction.atomic() on this "
+            "version of Django, the files would be written before the "
+            "transaction commits.")
+
+    writes = []
+    scopes.append(writes)
+    try:
+        with transaction.atomic(using=using):
+            yield
+    except BaseException:
+        for write in writes:
+            write.rollback()
+        raise
+    finally:
+        scopes.pop()
+
+    if scopes:
+        # The enclosing block may still roll back
+        scopes[-1].extend(writes)
+    elif hasattr(transaction, 'on_commit'):
+        transaction.on_commit(lambda: _commit_all(writes), using=using)
+    else:
+        _commit_all(writes)
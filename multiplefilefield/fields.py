@@ -1,18 +1,27 @@
+import ast
 import datetime
+import json
 import os
+import threading
+import uuid
 import warnings
 
 from django.core import checks
-from django.db import models
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import models, router
+from django.db.models import signals
 
 from django.core.files.base import File
 from django.utils import six
 from django.utils.deprecation import RemovedInDjango110Warning
-from django.utils.encoding import force_str, force_text
+from django.utils.encoding import force_str, force_text, smart_str, smart_text
 from django.utils.inspect import func_supports_parameter
 from django.core.files.storage import default_storage
 
+from multiplefilefield import checksums
+from multiplefilefield.deferred import StagedWrite, default_staging_storage, stage_write
 from multiplefilefield.forms import MultipleFileField
+from multiplefilefield.utils import get_label, thread_map
 
 
 class FieldFile(File):
@@ -22,7 +31,11 @@ class FieldFile(File):
         self.field = field
         self.storage = field.storage
         self._committed = True
-        self._size = 0
+        # Metadata caches, filled by save() and prefetch_file_metadata()
+        self._size = None
+        self._url = None
+        # Recorded digest of the content, "<algorithm>:<hexdigest>"
+        self.checksum = None
 
     def __eq__(self, other):
         # Older code may be expecting MultipleFileModelField values to be simple strings.
@@ -66,6 +79,8 @@ class FieldFile(File):
 
     def _get_url(self):
         self._require_file()
+        if self._url is not None:
+            return self._url
         return self.storage.url(self.name)
     url = property(_get_url)
 
@@ -73,6 +88,8 @@ class FieldFile(File):
         self._require_file()
         if not self._committed:
             return self.file.size
+        if self._size is not None:
+            return self._size
         return self.storage.size(self.name)
     size = property(_get_size)
 
@@ -90,17 +107,16 @@ class FieldFile(File):
         # Check whether named
         if not getattr(self.file, "_named", False):
             name = self.field.generate_filename(self.instance, name)
+            if self.field.filename_strategy:
+                name = self.field.generate_unique_filename(name)
 
-        if func_supports_parameter(self.storage.save, 'max_length'):
-            self.name = self.storage.save(name, content, max_length=self.field.max_length)
-        else:
-            warnings.warn(
-                'Backwards compatibility for storage backends without '
-                'support for the `max_length` argument in '
-                'Storage.save() will be removed in Django 1.10.',
-                RemovedInDjango110Warning, stacklevel=2
-            )
-            self.name = self.storage.save(name, content)
+        if self.field.checksum:
+            if not hasattr(content, 'chunks'):
+                content = File(content)
+            content = checksums.HashingFile(content, self.field.checksum)
+        self.name = self._storage_save(name, content)
+        if self.field.checksum:
+            self.checksum = content.checksum
 
         self.field.file_save_cache_list.append(self)
         setattr(self.instance, self.field.name, self.field.file_save_cache_list)
@@ -114,6 +130,50 @@ class FieldFile(File):
             self.instance.save()
     save.alters_data = True
 
+    def _storage_save(self, name, content):
+        final_name = name
+        if self.field.filename_strategy:
+            if hasattr(self.storage, 'route_name'):
+                # Record the backend the file will be written to
+                final_name = self.storage.route_name(name, content)
+            # Unlike get_available_name(), _save() does not shorten long names
+            if self.field.max_length and len(final_name) > self.field.max_length:
+                raise SuspiciousFileOperation(
+                    'The name "%s" is longer than the max_length of %d of the field. '
+                    'Please make sure that upload_to leaves room for the generated '
+                    'file names.' % (final_name, self.field.max_length))
+
+        if self.field.deferred_writes:
+            # Only write to the local staging storage within the transaction,
+            # the final storage is written once it commits
+            staging_storage = self.field.staging_storage
+            staged_name = staging_storage.save(name, content)
+            # The database save() writes to, the router's only for files
+            # saved on their own
+            using = (self.instance.__dict__.get('_saving_database') or self.instance._state.db or
+                     router.db_for_write(self.instance.__class__, instance=self.instance))
+            write = StagedWrite(staging_storage, staged_name, self.storage, final_name, get_label(self.field))
+            stage_write(write, using=using)
+            return final_name
+
+        if self.field.filename_strategy:
+            # The name is collision-free already, so go straight to _save()
+            # and skip the exists() probes of get_available_name().
+            if not hasattr(content, 'chunks'):
+                content = File(content)
+            name = self.storage._save(final_name, content)
+            return force_text(name.replace('\\', '/'))
+
+        if func_supports_parameter(self.storage.save, 'max_length'):
+            return self.storage.save(name, content, max_length=self.field.max_length)
+        warnings.warn(
+            'Backwards compatibility for storage backends without '
+            'support for the `max_length` argument in '
+            'Storage.save() will be removed in Django 1.10.',
+            RemovedInDjango110Warning, stacklevel=3
+        )
+        return self.storage.save(name, content)
+
     def delete(self, save=True):
         if not self:
             return
@@ -128,9 +188,10 @@ class FieldFile(File):
         self.name = None
         setattr(self.instance, self.field.name, self.name)
 
-        # Delete the file size cache
-        if hasattr(self, '_size'):
-            del self._size
+        # Delete the metadata caches
+        self._size = None
+        self._url = None
+        self.checksum = None
         self._committed = False
 
         if save:
@@ -150,9 +211,181 @@ class FieldFile(File):
     def __getstate__(self):
         # FieldFile needs access to its associated model field and an instance
         # it's attached to in order to work properly, but the only necessary
-        # data to be pickled is the file's name itself. Everything else will
-        # be restored later, by FileDescriptor below.
-        return {'name': self.name, 'closed': False, '_committed': True, '_file': None}
+        # data to be pickled is the file's name itself, plus the cached
+        # metadata so that unpickled files do not hit the storage again.
+        # Everything else will be restored later, by MultipleFileDescriptor.
+        return {'name': self.name, 'closed': False, '_committed': True, '_file': None,
+                '_size': self._size, '_url': self._url, 'checksum': self.checksum}
+
+
+class ReadOnlyFieldFile(object):
+    """
+    A slim, read-only stand-in for FieldFile, returned by the descriptor for
+    instances fetched with MultipleFileQuerySet.read_only_files(). It has no
+    per-instance __dict__ and only answers name, url, size and path; any other
+    attribute (open(), save(), delete(), file...) upgrades it in place to a
+    full attr_class instance first.
+    """
+    __slots__ = ('instance', 'field', 'name', 'checksum', '_size', '_url', '_full')
+
+    # Read-only handles always refer to files already in the storage
+    _committed = True
+
+    def __init__(self, instance, field, name):
+        self.instance = instance
+        self.field = field
+        self.name = name
+        self.checksum = None
+        self._size = None
+        self._url = None
+        self._full = None
+
+    def __str__(self):
+        return smart_str(self.name or '')
+
+    def __unicode__(self):
+        return smart_text(self.name or '')
+
+    def __repr__(self):
+        return force_str("<%s: %s>" % (self.__class__.__name__, self or "None"))
+
+    def __bool__(self):
+        return bool(self.name)
+
+    def __nonzero__(self):      # Python 2 compatibility
+        return type(self).__bool__(self)
+
+    def __eq__(self, other):
+        if hasattr(other, 'name'):
+            return self.name == other.name
+        return self.name == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def _require_file(self):
+        if not self:
+            raise ValueError("The '%s' attribute has no file associated with it." % self.field.name)
+
+    @property
+    def storage(self):
+        return self.field.storage
+
+    @property
+    def path(self):
+        self._require_file()
+        return self.storage.path(self.name)
+
+    @property
+    def url(self):
+        self._require_file()
+        if self._url is not None:
+            return self._url
+        return self.storage.url(self.name)
+
+    @property
+    def size(self):
+        self._require_file()
+        if self._size is not None:
+            return self._size
+        return self.storage.size(self.name)
+
+    def upgrade(self):
+        """
+        Returns a full attr_class instance for this file, and puts it in place
+        of this handle in the instance's file list.
+        """
+        if self._full is None:
+            self._full = self.field.attr_class(self.instance, self.field, self.name)
+            self._full.checksum = self.checksum
+            self._full._size = self._size
+            self._full._url = self._url
+            files = self.instance.__dict__.get(self.field.name)
+            if isinstance(files, list):
+                for i, item in enumerate(files):
+                    if item is self:
+                        files[i] = self._full
+        return self._full
+
+    def __getstate__(self):
+        # Same as FieldFile, instance and field are restored by the descriptor
+        return {'name': self.name, 'checksum': self.checksum, '_size': self._size, '_url': self._url}
+
+    def __setstate__(self, state):
+        self.instance = self.field = self._full = None
+        self.name = state['name']
+        self.checksum = state['checksum']
+        self._size = state['_size']
+        self._url = state['_url']
+
+    def __getattr__(self, name):
+        # Only called for names not defined above
+        if name in self.__slots__ or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.upgrade(), name)
+
+
+# Upload directories resolved for the batches of files being saved, by field,
+# in each thread
+_directory_names = threading.local()
+
+
+def load_entries(value):
+    """
+    Returns the entries of a value stored in the structured format, a JSON
+    list of names or of {"name": ..., "checksum": ...} objects, or None if
+    value is in the legacy format, the repr() of a list of names.
+    """
+    if not value.startswith('['):
+        return None
+    try:
+        entries = json.loads(value)
+    except ValueError:
+        return None
+    return entries if isinstance(entries, list) else None
+
+
+def parse_legacy_value(value):
+    """
+    Returns the names of a value stored in the legacy format, the repr() of
+    a list of names ("[u'a.txt', u'b.txt']"), or a single name.
+
+    A repr() is evaluated as a literal, which restores escapes, quotes and
+    ", " within names exactly; other values are split on ", ".
+    """
+    if value[0] == '[':
+        try:
+            names = ast.literal_eval(value)
+        except (SyntaxError, ValueError):
+            names = None
+        if isinstance(names, list) and all(isinstance(name, six.string_types) for name in names):
+            return [force_text(name) for name in names]
+        value = value[1:]
+    if value and value[-1] == ']':
+        value = value[:len(value) - 1]
+    names = []
+    for name in value.split(", "):
+        if name:
+            name = name.strip()
+            if name[0] == 'u' and name[1] == "\'":
+                name = name[2:]
+            if name[0] == '\'':
+                name = name[1:]
+            if name[-1] == "\'":
+                name = name[:len(name) - 1]
+            names.append(name)
+    return names
+
+
+def remember_saving_database(sender, instance, using, **kwargs):
+    """
+    pre_save receiver recording the database instance is saved to, which
+    pre_save() is not told, for deferred writes to wait for its commit.
+    """
+    instance.__dict__['_saving_database'] = using
 
 
 class MultipleFileDescriptor(object):
@@ -177,7 +410,11 @@ class MultipleFileDescriptor(object):
             _file.instance = instance
             _file.field = self.field
             _file.storage = self.field.storage
-            return instance
+            return _file
+        elif isinstance(_file, ReadOnlyFieldFile) and _file.field is None:
+            _file.instance = instance
+            _file.field = self.field
+            return _file
         elif _file is None:
             return ""
 
@@ -204,6 +441,12 @@ class MultipleFileDescriptor(object):
         files = instance.__dict__[self.field.name]
         temp_list = []
 
+        # Instances fetched with read_only_files() get the slim handles
+        if self.field.name in instance.__dict__.get('_read_only_file_fields', ()):
+            attr_class = self.field.read_only_class
+        else:
+            attr_class = self.field.attr_class
+
         if isinstance(files, list):
             for _file in files:
                 temp_list.append(self.__wrap__(_file, instance))
@@ -216,24 +459,24 @@ class MultipleFileDescriptor(object):
             # object understands how to convert a path to a file, and also how to
             # handle None.
             if isinstance(files, six.string_types) or files is None:
-                if files:
-                    if files[0] == '[':
-                        files = files[1:]
-                    if files[-1] == ']':
-                        files = files[:len(files) - 1]
-                    file_name_list = list(files.split(", "))
+                entries = load_entries(files) if files else None
+                if entries is not None:
                     file_list = []
-                    for _file in file_name_list:
-                        if _file:
-                            _file = _file.strip()
-                            if _file[0] == 'u' and _file[1] == "\'":
-                                _file = _file[2:]
-                            if _file[0] == '\'':
-                                _file = _file[1:]
-                            if _file[-1] == "\'":
-                                _file = _file[:len(_file) - 1]
-                            attr = self.field.attr_class(instance, self.field, _file)
-                            file_list.append(attr)
+                    for entry in entries:
+                        if isinstance(entry, dict):
+                            attr = attr_class(instance, self.field, entry['name'])
+                            attr.checksum = entry.get('checksum')
+                        else:
+                            attr = attr_class(instance, self.field, entry)
+                        file_list.append(attr)
+                    instance.__dict__[self.field.name] = file_list
+                elif files:
+                    if self.field.legacy_values:
+                        file_name_list = parse_legacy_value(files)
+                    else:
+                        # Like a FileField, the value is a single name
+                        file_name_list = [files]
+                    file_list = [attr_class(instance, self.field, _file) for _file in file_name_list]
                     instance.__dict__[self.field.name] = file_list
                 else:
                     instance.__dict__[self.field.name] = ""
@@ -255,18 +498,31 @@ class MultipleFileModelField(models.Field):
     # the instance will always return an instance of attr_class.
     attr_class = FieldFile
 
+    # The class to wrap instance attributes in for read-only access.
+    read_only_class = ReadOnlyFieldFile
+
     # The descriptor to use for accessing the attribute off of the class.
     descriptor_class = MultipleFileDescriptor
 
     description = "File"
 
-    def __init__(self, verbose_name=None, name=None, upload_to='', storage=None, **kwargs):
+    # Strategies for names which never collide, see generate_unique_filename()
+    filename_strategies = ('uuid',)
+
+    def __init__(self, verbose_name=None, name=None, upload_to='', storage=None,
+                 filename_strategy=None, checksum=None, legacy_values=True,
+                 deferred_writes=False, staging_storage=None, **kwargs):
         self._primary_key_set_explicitly = 'primary_key' in kwargs
         self._unique_set_explicitly = 'unique' in kwargs
 
         self.file_save_cache_list = []
         self.storage = storage or default_storage
         self.upload_to = upload_to
+        self.filename_strategy = filename_strategy
+        self.checksum = checksum
+        self.legacy_values = legacy_values
+        self.deferred_writes = deferred_writes
+        self.staging_storage = staging_storage or default_staging_storage
         if callable(upload_to):
             self.generate_filename = upload_to
 
@@ -277,16 +533,75 @@ class MultipleFileModelField(models.Field):
         """Returns field's value just before saving."""
         files = super(MultipleFileModelField, self).pre_save(model_instance, add)
         self.file_save_cache_list = []
-        files_string = []
+        entries = []
         if files:
+            # The upload directory is resolved once for the whole batch
+            directory_name = self.get_directory_name()
+
+            def save(_file):
+                self.set_batch_directory_name(directory_name)
+                try:
+                    _file.save(_file.name, _file, save=False)
+                finally:
+                    self.set_batch_directory_name(None)
+
             # Commit the file to storage prior to saving the model
             # Can raise not null here in future
+            pending = [_file for _file in files
+                       if isinstance(_file, FieldFile) and not _file._committed]
+            if len(pending) > 1 and getattr(self.storage, 'parallel_writes', False) \
+                    and not self.deferred_writes:
+                thread_map(save, pending)
+                # Restore the order of the files, whichever finished first
+                self.file_save_cache_list[:] = pending
+            else:
+                for _file in pending:
+                    save(_file)
+
             for _file in files:
-                if isinstance(_file, FieldFile):
-                    if not _file._committed:
-                        _file.save(_file.name, _file, save=False)
-                    files_string.append(_file.name)
-        return files_string
+                if isinstance(_file, (FieldFile, ReadOnlyFieldFile)):
+                    entries.append(self.get_file_entry(_file))
+        # The attribute now only holds the files saved by this call, keep the
+        # saved value for the post_save receivers, see get_saved_value()
+        model_instance.__dict__.setdefault('_saved_file_values', {})[self.attname] = entries
+        return entries
+
+    def get_saved_value(self, model_instance):
+        """
+        Returns the database value written by the last save of model_instance,
+        or None if it did not save this field.
+        """
+        entries = model_instance.__dict__.get('_saved_file_values', {}).get(self.attname)
+        return self.get_prep_value(entries) if entries is not None else None
+
+    def set_batch_directory_name(self, directory_name):
+        """
+        Makes get_directory_name() return directory_name in the current
+        thread, or resolve it again if None.
+        """
+        if not hasattr(_directory_names, 'by_field'):
+            _directory_names.by_field = {}
+        if directory_name is None:
+            _directory_names.by_field.pop(id(self), None)
+        else:
+            _directory_names.by_field[id(self)] = directory_name
+
+    def get_names(self, value):
+        """Returns the names of the files in a database value."""
+        if not value:
+            return []
+        entries = load_entries(value)
+        if entries is not None:
+            return [entry['name'] if isinstance(entry, dict) else entry for entry in entries]
+        if self.legacy_values:
+            return parse_legacy_value(value)
+        return [value]
+
+    def get_file_entry(self, _file):
+        """Returns the entry of _file in the structured format."""
+        if _file.checksum:
+            return {'name': _file.name, 'checksum': _file.checksum}
+        return _file.name
 
     def get_internal_type(self):
         return "CharField"
@@ -301,6 +616,8 @@ class MultipleFileModelField(models.Field):
                 # Pickup to save
                 data_temp = []
                 for d in data:
+                    if isinstance(d, ReadOnlyFieldFile):
+                        d = d.upgrade()
                     if isinstance(d, FieldFile):
                         # Set _named, when data picked from database, do not rename it
                         setattr(d.file, "_named", True)
@@ -320,6 +637,9 @@ class MultipleFileModelField(models.Field):
         if value is None:
             value = super(MultipleFileModelField, self).get_prep_value(value)
             return six.text_type(value) if value is not None else None
+        if isinstance(value, list):
+            entries = [self.get_file_entry(v) if hasattr(v, 'checksum') else v for v in value]
+            return force_text(json.dumps(entries, separators=(',', ':'), ensure_ascii=False))
         return six.text_type(value)
 
     """
@@ -330,6 +650,9 @@ class MultipleFileModelField(models.Field):
         errors = super(MultipleFileModelField, self).check(**kwargs)
         errors.extend(self._check_unique())
         errors.extend(self._check_primary_key())
+        errors.extend(self._check_filename_strategy())
+        errors.extend(self._check_checksum())
+        errors.extend(self._check_deferred_writes())
         return errors
 
     def _check_unique(self):
@@ -358,6 +681,45 @@ class MultipleFileModelField(models.Field):
         else:
             return []
 
+    def _check_filename_strategy(self):
+        if self.filename_strategy and self.filename_strategy not in self.filename_strategies:
+            return [
+                checks.Error(
+                    "'filename_strategy' must be one of %s." % ', '.join(self.filename_strategies),
+                    hint=None,
+                    obj=self,
+                    id='multiplefilefield.E001',
+                )
+            ]
+        else:
+            return []
+
+    def _check_checksum(self):
+        if self.checksum and not checksums.is_supported(self.checksum):
+            return [
+                checks.Error(
+                    "'checksum' algorithm '%s' is not available." % self.checksum,
+                    hint="xxhash algorithms require the xxhash package.",
+                    obj=self,
+                    id='multiplefilefield.E002',
+                )
+            ]
+        else:
+            return []
+
+    def _check_deferred_writes(self):
+        if self.deferred_writes and not self.filename_strategy:
+            return [
+                checks.Error(
+                    "'deferred_writes' requires a 'filename_strategy'.",
+                    hint="The names are recorded before the files reach the storage, so they must not collide.",
+                    obj=self,
+                    id='multiplefilefield.E003',
+                )
+            ]
+        else:
+            return []
+
     def deconstruct(self):
         name, path, args, kwargs = super(MultipleFileModelField, self).deconstruct()
         if kwargs.get("max_length", None) == 100:
@@ -365,6 +727,16 @@ class MultipleFileModelField(models.Field):
         kwargs['upload_to'] = self.upload_to
         if self.storage is not default_storage:
             kwargs['storage'] = self.storage
+        if self.filename_strategy:
+            kwargs['filename_strategy'] = self.filename_strategy
+        if self.checksum:
+            kwargs['checksum'] = self.checksum
+        if not self.legacy_values:
+            kwargs['legacy_values'] = False
+        if self.deferred_writes:
+            kwargs['deferred_writes'] = True
+        if self.staging_storage is not default_staging_storage:
+            kwargs['staging_storage'] = self.staging_storage
         return name, path, args, kwargs
 
     def get_prep_lookup(self, lookup_type, value):
@@ -375,8 +747,15 @@ class MultipleFileModelField(models.Field):
     def contribute_to_class(self, cls, name, **kwargs):
         super(MultipleFileModelField, self).contribute_to_class(cls, name, **kwargs)
         setattr(cls, self.name, self.descriptor_class(self))
+        if not cls._meta.abstract:
+            signals.pre_save.connect(remember_saving_database, sender=cls,
+                                     dispatch_uid='multiplefilefield.saving_database')
 
     def get_directory_name(self):
+        # Cached by pre_save() while a batch of files is being saved
+        directory_name = getattr(_directory_names, 'by_field', {}).get(id(self))
+        if directory_name is not None:
+            return directory_name
         return os.path.normpath(force_text(datetime.datetime.now().strftime(force_str(self.upload_to))))
 
     def get_filename(self, filename):
@@ -385,6 +764,15 @@ class MultipleFileModelField(models.Field):
     def generate_filename(self, instance, filename):
         return os.path.join(self.get_directory_name(), self.get_filename(filename))
 
+    def generate_unique_filename(self, filename):
+        """
+        Replaces the base name of filename according to filename_strategy,
+        keeping its directory and extension: 'uuid' uses a random UUID.
+        """
+        dir_name, file_name = os.path.split(filename)
+        ext = os.path.splitext(file_name)[1]
+        return os.path.join(dir_name, uuid.uuid4().hex + ext)
+
     def formfield(self, **kwargs):
         defaults = {'form_class': MultipleFileField,
                     'max_length': self.max_length}
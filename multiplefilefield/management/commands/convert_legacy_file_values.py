@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from multiplefilefield.conversion import convert_legacy_values
+from multiplefilefield.utils import get_fields
+
+
+class Command(BaseCommand):
+    help = "Converts the values stored in the legacy format to the structured format, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', metavar='app_label[.Model[.field]]',
+                            help='Restricts the conversion to these apps, models or fields.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows converted per transaction.')
+        parser.add_argument('--start-after', default=None,
+                            help='Resumes after this primary key, as printed by a previous run.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Pause in seconds between batches.')
+        parser.add_argument('--database', default=None,
+                            help='Database to convert, the write database of each model by default.')
+
+    def handle(self, *args, **options):
+        labels = options['labels']
+        try:
+            fields = get_fields(labels)
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        # Convert all the fields of a model in the same walk over its table
+        models = []
+        for field in fields:
+            if field.model not in models:
+                models.append(field.model)
+
+        if options['start_after'] is not None and len(models) > 1:
+            raise CommandError("--start-after requires the fields of a single model.")
+
+        for model in models:
+            model_fields = [field for field in fields if field.model is model]
+            label = '%s.%s' % (model._meta.app_label, model._meta.object_name)
+            total = 0
+            for last_pk, converted in convert_legacy_values(
+                    model, model_fields, options['batch_size'], options['start_after'],
+                    options['sleep'], options['database']):
+                total += converted
+                self.stdout.write("%s: converted %d rows up to pk=%s" % (label, converted, last_pk))
+            self.stdout.write("%s: %d rows converted." % (label, total))
@@ -0,0 +1,42 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from multiplefilefield.deferred import FAILED_SUFFIX, walk
+from multiplefilefield.utils import get_fields
+
+
+class Command(BaseCommand):
+    help = ("Deletes the files left in the staging storages of deferred_writes fields, "
+            "by transactions which rolled back or crashed, except those whose write failed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', metavar='app_label[.Model[.field]]',
+                            help='Restricts the purge to the staging storages of these apps, models or fields.')
+        parser.add_argument('--older-than', type=int, default=24 * 60 * 60,
+                            help='Age in seconds of the staged files to delete, one day by default.')
+
+    def handle(self, *args, **options):
+        try:
+            fields = get_fields(options['labels'])
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        storages = []
+        for field in fields:
+            if field.deferred_writes and field.staging_storage not in storages:
+                storages.append(field.staging_storage)
+
+        limit = datetime.datetime.now() - datetime.timedelta(seconds=options['older_than'])
+        count = 0
+        for storage in storages:
+            if not storage.exists(''):
+                continue
+            for name in list(walk(storage)):
+                if name.endswith(FAILED_SUFFIX) or storage.exists(name + FAILED_SUFFIX):
+                    # Committed rows refer to it, see retry_staged_writes
+                    continue
+                if storage.modified_time(name) < limit:
+                    storage.delete(name)
+                    count += 1
+        self.stdout.write("%d staged files deleted." % count)
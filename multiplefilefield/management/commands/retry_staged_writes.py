@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from multiplefilefield.deferred import FAILED_SUFFIX, StagedWrite, walk
+from multiplefilefield.utils import get_fields, get_label
+
+
+class Command(BaseCommand):
+    help = ("Writes again the staged files of deferred_writes fields which failed to reach their storage "
+            "after the transaction committed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', metavar='app_label[.Model[.field]]',
+                            help='Restricts the retry to the failed writes of these apps, models or fields.')
+
+    def handle(self, *args, **options):
+        try:
+            fields = get_fields(options['labels'])
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        storages = {}
+        staging_storages = []
+        for field in fields:
+            if field.deferred_writes:
+                storages[get_label(field)] = field.storage
+                if field.staging_storage not in staging_storages:
+                    staging_storages.append(field.staging_storage)
+
+        counts = {'written': 0, 'failed': 0}
+        for staging_storage in staging_storages:
+            if not staging_storage.exists(''):
+                continue
+            for name in list(walk(staging_storage)):
+                if not name.endswith(FAILED_SUFFIX):
+                    continue
+                try:
+                    write = StagedWrite.load(staging_storage, name, storages)
+                except KeyError:
+                    # The write of another field
+                    continue
+                if write.commit():
+                    counts['written'] += 1
+                else:
+                    counts['failed'] += 1
+                    self.stdout.write(self.style.ERROR("FAILED %s: %s" % (write.label, write.name)))
+
+        self.stdout.write("%(written)d staged files written, %(failed)d failed." % counts)
+        if counts['failed']:
+            raise CommandError("Some staged files failed to be written.")
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from multiplefilefield.checksums import verify_checksum
+from multiplefilefield.utils import get_fields, thread_map
+
+
+class Command(BaseCommand):
+    help = "Re-reads the stored files and verifies them against their recorded checksums."
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', metavar='app_label[.Model[.field]]',
+                            help='Restricts the verification to these apps, models or fields.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of files verified in parallel.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of files read from the database at a time.')
+
+    def handle(self, *args, **options):
+        labels = options['labels']
+        self.workers = options['workers']
+        self.counts = {'verified': 0, 'mismatch': 0, 'missing': 0, 'error': 0}
+
+        try:
+            fields = get_fields(labels)
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        for field in fields:
+            batch = []
+            queryset = field.model._default_manager.only(field.model._meta.pk.name, field.attname)
+            for instance in queryset.iterator():
+                for _file in getattr(instance, field.name) or []:
+                    if _file.checksum:
+                        batch.append((field, instance.pk, _file))
+                if len(batch) >= options['batch_size']:
+                    self.verify(batch)
+                    batch = []
+            self.verify(batch)
+
+        self.stdout.write("%(verified)d files verified, %(mismatch)d mismatched, %(missing)d missing, "
+                          "%(error)d unreadable." % self.counts)
+        if self.counts['mismatch'] or self.counts['missing'] or self.counts['error']:
+            raise CommandError("Some files failed the verification.")
+
+    def verify(self, batch):
+        for (field, pk, _file), result in zip(batch, thread_map(self.verify_file, batch, self.workers)):
+            self.counts[result] += 1
+            if result != 'verified':
+                self.stdout.write(self.style.ERROR("%s %s.%s.%s pk=%s: %s" % (
+                    result.upper(), field.model._meta.app_label, field.model._meta.object_name,
+                    field.name, pk, _file.name)))
+
+    def verify_file(self, item):
+        _file = item[2]
+        try:
+            f = _file.storage.open(_file.name, 'rb')
+        except (IOError, OSError):
+            return 'missing'
+        try:
+            return 'verified' if verify_checksum(f, _file.checksum) else 'mismatch'
+        except (IOError, OSError):
+            # Reported with the other files rather than aborting the run
+            return 'error'
+        finally:
+            f.close()
@@ -0,0 +1,98 @@
+import os
+from collections import OrderedDict
+
+from django.db import models
+
+from multiplefilefield.utils import thread_map
+
+
+def _fetch_metadata(storage, _file):
+    try:
+        return storage.size(_file.name), storage.url(_file.name)
+    except (IOError, OSError, NotImplementedError):
+        # Leave it uncached, accessing it later raises as usual
+        return None, None
+
+
+def prefetch_file_metadata(instances, *field_names, **kwargs):
+    """
+    Warms the size and url caches of every file of field_names across
+    instances, so later accesses to FieldFile.size and FieldFile.url do not
+    hit the storage.
+
+    A storage may provide get_metadata(path, names), returning a dict of
+    {name: {'size': ..., 'url': ...}} for the names under path; it is then
+    called once per directory. Other storages are queried file by file in
+    a pool of max_workers threads.
+    """
+    max_workers = kwargs.pop('max_workers', None)
+
+    # Group the files by storage, then by directory
+    groups = OrderedDict()
+    for instance in instances:
+        for field_name in field_names:
+            for _file in getattr(instance, field_name) or []:
+                if not _file or not _file._committed:
+                    continue
+                storage, directories = groups.setdefault(id(_file.storage), (_file.storage, OrderedDict()))
+                directories.setdefault(os.path.dirname(_file.name), []).append(_file)
+
+    for storage, directories in groups.values():
+        if hasattr(storage, 'get_metadata'):
+            for path, files in directories.items():
+                metadata = storage.get_metadata(path, [_file.name for _file in files])
+                for _file in files:
+                    if _file.name in metadata:
+                        _file._size = metadata[_file.name].get('size')
+                        _file._url = metadata[_file.name].get('url')
+        else:
+            files = [_file for files in directories.values() for _file in files]
+            results = thread_map(lambda _file: _fetch_metadata(storage, _file), files, max_workers)
+            for _file, (size, url) in zip(files, results):
+                _file._size = size
+                _file._url = url
+
+
+class MultipleFileQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super(MultipleFileQuerySet, self).__init__(*args, **kwargs)
+        self._file_metadata_fields = ()
+        self._read_only_file_fields = ()
+
+    def _clone(self, *args, **kwargs):
+        clone = super(MultipleFileQuerySet, self)._clone(*args, **kwargs)
+        clone._file_metadata_fields = self._file_metadata_fields
+        clone._read_only_file_fields = self._read_only_file_fields
+        return clone
+
+    def prefetch_file_metadata(self, *field_names):
+        """
+        Fetches the size and url of the files of field_names for the whole
+        result set at once, see prefetch_file_metadata().
+        """
+        clone = self._clone()
+        clone._file_metadata_fields = self._file_metadata_fields + field_names
+        return clone
+
+    def read_only_files(self, *field_names):
+        """
+        Makes the files of field_names ReadOnlyFieldFile handles, which are
+        much lighter than FieldFile for listings.
+        """
+        clone = self._clone()
+        clone._read_only_file_fields = self._read_only_file_fields + field_names
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super(MultipleFileQuerySet, self)._fetch_all()
+        if fetched or not (self._file_metadata_fields or self._read_only_file_fields):
+            return
+
+        instances = [obj for obj in self._result_cache if isinstance(obj, models.Model)]
+        if self._read_only_file_fields:
+            read_only_file_fields = frozenset(self._read_only_file_fields)
+            for instance in instances:
+                instance._read_only_file_fields = read_only_file_fields
+        if self._file_metadata_fields:
+            prefetch_file_metadata(instances, *self._file_metadata_fields)
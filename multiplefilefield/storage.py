@@ -0,0 +1,140 @@
+import hashlib
+
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import force_bytes
+
+from multiplefilefield.utils import thread_map
+
+
+def route_by_hash(storage, name, content):
+    keys = sorted(storage.backends)
+    return keys[int(hashlib.md5(force_bytes(name)).hexdigest(), 16) % len(keys)]
+
+
+def route_by_size(storage, name, content):
+    return 'hot' if content.size < storage.size_threshold else 'cold'
+
+
+@deconstructible
+class RoutingStorage(Storage):
+    """
+    Distributes the files over several storages.
+
+    backends maps keys to storages, and router picks the key of each new file:
+    'hash' spreads them evenly by name, 'size' sends the files smaller than
+    size_threshold to the 'hot' backend and the others to the 'cold' one, and
+    a callable(storage, name, content) may return any key. The key is kept in
+    the returned name, "<key>:<name>"; names without a key belong to the
+    default backend. Names saved with a key go to that backend as they are.
+
+    MultipleFileModelField saves the files of a RoutingStorage in parallel,
+    and prefetch_file_metadata() reads their metadata in parallel.
+    """
+    separator = ':'
+    routers = {'hash': route_by_hash, 'size': route_by_size}
+
+    # Tells MultipleFileModelField to save several files at once
+    parallel_writes = True
+
+    def __init__(self, backends, router='hash', size_threshold=None, default=None):
+        self.backends = backends
+        self.router = router
+        self.size_threshold = size_threshold
+        self.default = default if default is not None else sorted(backends)[0]
+        if router == 'size' and (size_threshold is None or not {'hot', 'cold'} <= set(backends)):
+            raise ValueError("The 'size' router requires size_threshold and 'hot' and 'cold' backends.")
+
+    def route(self, name, content):
+        router = self.routers.get(self.router, self.router)
+        return router(self, name, content)
+
+    def route_name(self, name, content):
+        """
+        Returns name prefixed with the key of its backend, routing it unless
+        it has a key already; saving to the returned name keeps that backend.
+        """
+        key, separator, backend_name = name.partition(self.separator)
+        if separator and key in self.backends:
+            return name
+        return self.join(self.route(name, content), name)
+
+    def split(self, name):
+        """Returns the backend key and the backend name of name."""
+        key, separator, backend_name = name.partition(self.separator)
+        if separator and key in self.backends:
+            return key, backend_name
+        return self.default, name
+
+    def join(self, key, backend_name):
+        return '%s%s%s' % (key, self.separator, backend_name)
+
+    def backend(self, name):
+        key, backend_name = self.split(name)
+        return self.backends[key], backend_name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        key, name = self.split(self.route_name(name, content))
+        if max_length is not None:
+            # The key and the separator take part of the column
+            max_length -= len(key) + len(self.separator)
+        return self.join(key, self.backends[key].save(name, content, max_length=max_length))
+
+    def _save(self, name, content):
+        key, name = self.split(self.route_name(name, content))
+        return self.join(key, self.backends[key]._save(name, content))
+
+    def _open(self, name, mode='rb'):
+        backend, backend_name = self.backend(name)
+        return backend.open(backend_name, mode)
+
+    def delete(self, name):
+        backend, backend_name = self.backend(name)
+        backend.delete(backend_name)
+
+    def exists(self, name):
+        backend, backend_name = self.backend(name)
+        return backend.exists(backend_name)
+
+    def listdir(self, path):
+        backend, backend_name = self.backend(path)
+        return backend.listdir(backend_name)
+
+    def size(self, name):
+        backend, backend_name = self.backend(name)
+        return backend.size(backend_name)
+
+    def url(self, name):
+        backend, backend_name = self.backend(name)
+        return backend.url(backend_name)
+
+    def path(self, name):
+        backend, backend_name = self.backend(name)
+        return backend.path(backend_name)
+
+    def accessed_time(self, name):
+        backend, backend_name = self.backend(name)
+        return backend.accessed_time(backend_name)
+
+    def created_time(self, name):
+        backend, backend_name = self.backend(name)
+        return backend.created_time(backend_name)
+
+    def modified_time(self, name):
+        backend, backend_name = self.backend(name)
+        return backend.modified_time(backend_name)
+
+    def get_metadata(self, path, names):
+        """
+        Hook of prefetch_file_metadata(), fetching the metadata of names from
+        all the backends in parallel.
+        """
+        def fetch(name):
+            backend, backend_name = self.backend(name)
+            try:
+                return name, {'size': backend.size(backend_name), 'url': backend.url(backend_name)}
+            except (IOError, OSError, NotImplementedError):
+                return name, {}
+        return dict(thread_map(fetch, names))
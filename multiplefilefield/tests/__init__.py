@@ -0,0 +1,32 @@
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+from multiplefilefield_example.models import TestMultipleFile
+
+
+class TemporaryStorageMixin(object):
+    """
+    Points the files field of TestMultipleFile to a storage_class storage in
+    a temporary directory, and restores every attribute of the field after
+    the test, even if setUp() fails partway.
+    """
+    storage_class = FileSystemStorage
+
+    def setUp(self):
+        super(TemporaryStorageMixin, self).setUp()
+        self.field = TestMultipleFile._meta.get_field('files')
+        self.addCleanup(self.restore_field, dict(self.field.__dict__))
+        self.location = self.make_location()
+        self.field.storage = self.storage_class(location=self.location, base_url='/media/')
+
+    def make_location(self):
+        """Returns a temporary directory deleted after the test."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        return location
+
+    def restore_field(self, attributes):
+        self.field.__dict__.clear()
+        self.field.__dict__.update(attributes)
@@ -0,0 +1,96 @@
+from django.contrib.admin import AdminSite
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from multiplefilefield.admin import MultipleFileModelAdmin, file_summary, get_cache, summary_cache_key
+from multiplefilefield.tests import TemporaryStorageMixin
+from multiplefilefield_example.models import TestMultipleFile
+
+
+class UrlCountingStorage(FileSystemStorage):
+    """
+    FileSystemStorage which counts its url calls
+    """
+    def __init__(self, *args, **kwargs):
+        super(UrlCountingStorage, self).__init__(*args, **kwargs)
+        self.url_calls = 0
+
+    def url(self, name):
+        self.url_calls += 1
+        return super(UrlCountingStorage, self).url(name)
+
+
+class FileSummaryTestCase(TemporaryStorageMixin, TestCase):
+    storage_class = UrlCountingStorage
+
+    def setUp(self):
+        super(FileSummaryTestCase, self).setUp()
+        get_cache().clear()
+        self.model = TestMultipleFile(name="summary")
+        self.model.files = [ContentFile(b"1", name="a.txt"), ContentFile(b"2", name="b.txt")]
+        self.model.save()
+        self.summary = file_summary('files')
+
+    def test_file_summary(self):
+        """
+        Test the summary is rendered once and served from the cache
+        """
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        html = self.summary(model)
+        self.assertEqual('2 files<br/><a href="/media/a.txt">a.txt</a><br/><a href="/media/b.txt">b.txt</a>', html)
+        self.assertEqual(2, self.field.storage.url_calls)
+
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        self.assertEqual(html, self.summary(model))
+        self.assertEqual(2, self.field.storage.url_calls)
+        # The field was not decoded
+        self.assertIsInstance(model.__dict__['files'], type(u''))
+
+        self.assertEqual('files', self.summary.short_description)
+        self.assertTrue(self.summary.allow_tags)
+
+    def test_file_summary_without_links(self):
+        """
+        Test the summary without links only counts the files
+        """
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        self.assertEqual('2 files', file_summary('files', links=False)(model))
+        self.assertEqual(0, self.field.storage.url_calls)
+
+    def test_file_summary_invalidation(self):
+        """
+        Test saving an instance refreshes its summary
+        """
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        self.summary(model)
+        self.field.storage = UrlCountingStorage(location=self.location, base_url='/other/')
+
+        model.save()
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        self.assertIn('<a href="/other/a.txt">a.txt</a>', self.summary(model))
+
+    def test_file_summary_invalidation_append(self):
+        """
+        Test appending a file drops the summary of the whole saved value
+        """
+        raw_value = self.field.get_prep_value(["./a.txt", "./b.txt", "./c.txt"])
+        get_cache().set(summary_cache_key(self.field, raw_value, True), "stale")
+
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        model.files = list(model.files) + [ContentFile(b"3", name="c.txt")]
+        model.save()
+        self.assertEqual(raw_value, TestMultipleFile.objects.values_list('files', flat=True).get(pk=model.pk))
+        self.assertIsNone(get_cache().get(summary_cache_key(self.field, raw_value, True)))
+
+    def test_file_links(self):
+        """
+        Test the change form drops the links only when file_links is False
+        """
+        model_admin = MultipleFileModelAdmin(TestMultipleFile, AdminSite())
+        formfield = model_admin.formfield_for_dbfield(self.field, request=None)
+        self.assertTrue(formfield.widget.links)
+
+        model_admin.file_links = False
+        formfield = model_admin.formfield_for_dbfield(self.field, request=None)
+        self.assertFalse(formfield.widget.links)
@@ -0,0 +1,231 @@
+import json
+import os
+
+from django.apps import apps
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.state import ProjectState
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+
+from multiplefilefield import checksums
+from multiplefilefield.conversion import ConvertLegacyFileValues, update_values
+from multiplefilefield.tests import TemporaryStorageMixin
+from multiplefilefield_example.models import TestMultipleFile
+
+
+class ReadingStorage(FileSystemStorage):
+    """
+    FileSystemStorage writing through read() like remote storages, reading
+    the first bytes twice
+    """
+    def _save(self, name, content):
+        content.seek(0)
+        content.read(2)
+        content.seek(0)
+        data = b''
+        while True:
+            chunk = content.read(3)
+            if not chunk:
+                break
+            data += chunk
+        return super(ReadingStorage, self)._save(name, ContentFile(data))
+
+
+class UnreadableFile(File):
+    def read(self, *args, **kwargs):
+        raise IOError("Connection reset")
+
+
+class FailingReadStorage(FileSystemStorage):
+    """
+    FileSystemStorage failing to read the files named a*
+    """
+    def _open(self, name, mode='rb'):
+        _file = super(FailingReadStorage, self)._open(name, mode)
+        if os.path.basename(name).startswith('a'):
+            return UnreadableFile(_file.file, name)
+        return _file
+
+
+class VerifyFileChecksumsTestCase(TemporaryStorageMixin, TestCase):
+    def setUp(self):
+        super(VerifyFileChecksumsTestCase, self).setUp()
+        self.field.checksum = 'sha256'
+        self.model = TestMultipleFile(name="checksum")
+        self.model.files = [ContentFile(b"12345", name="a.txt"), ContentFile(b"123", name="b.txt")]
+        self.model.save()
+
+    def test_checksum_saved(self):
+        """
+        Test checksums are recorded with the entries
+        """
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        self.assertEqual(
+            ["sha256:5994471abb01112afcc18159f6cc74b4f511b99806da59b3caf5a9c173cacfc5",
+             "sha256:a665a45920422f9d417e4867efdc4fb8a04a1f3fff1fa07e998e86f7f7a27ae3"],
+            [_file.checksum for _file in model.files])
+
+    def test_checksum_saved_through_read(self):
+        """
+        Test checksums come from the storage's own reads
+        """
+        self.field.storage = ReadingStorage(location=self.location)
+        compute_checksum = checksums.compute_checksum
+        calls = []
+        checksums.compute_checksum = lambda *args: calls.append(args) or compute_checksum(*args)
+        try:
+            model = TestMultipleFile(name="read")
+            model.files = [ContentFile(b"12345", name="a.txt")]
+            model.save()
+        finally:
+            checksums.compute_checksum = compute_checksum
+
+        self.assertEqual([], calls)
+        model = TestMultipleFile.objects.get(pk=model.pk)
+        self.assertEqual("sha256:5994471abb01112afcc18159f6cc74b4f511b99806da59b3caf5a9c173cacfc5",
+                         model.files[0].checksum)
+        self.assertEqual(b"12345", model.files[0].read())
+
+    def test_verify(self):
+        """
+        Test intact files pass the verification
+        """
+        out = StringIO()
+        call_command('verify_file_checksums', 'multiplefilefield_example.TestMultipleFile', stdout=out)
+        self.assertIn("2 files verified, 0 mismatched, 0 missing, 0 unreadable.", out.getvalue())
+
+    def test_verify_mismatch(self):
+        """
+        Test altered and missing files are reported
+        """
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        self.field.storage.delete(model.files[0].name)
+        self.field.storage.delete(model.files[1].name)
+        self.field.storage.save(model.files[1].name, ContentFile(b"altered"))
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('verify_file_checksums', 'multiplefilefield_example.TestMultipleFile.files',
+                         stdout=out, workers=2)
+        self.assertIn("MISSING multiplefilefield_example.TestMultipleFile.files", out.getvalue())
+        self.assertIn("MISMATCH multiplefilefield_example.TestMultipleFile.files", out.getvalue())
+        self.assertIn("0 files verified, 1 mismatched, 1 missing, 0 unreadable.", out.getvalue())
+
+    def test_verify_read_error(self):
+        """
+        Test files failing to read are reported without aborting the run
+        """
+        self.field.storage = FailingReadStorage(location=self.location)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('verify_file_checksums', 'multiplefilefield_example.TestMultipleFile', stdout=out)
+        self.assertIn("ERROR multiplefilefield_example.TestMultipleFile.files", out.getvalue())
+        self.assertIn("1 files verified, 0 mismatched, 0 missing, 1 unreadable.", out.getvalue())
+
+    def test_verify_label(self):
+        """
+        Test labels restrict the verified fields
+        """
+        model = TestMultipleFile.objects.get(pk=self.model.pk)
+        self.field.storage.delete(model.files[0].name)
+
+        out = StringIO()
+        call_command('verify_file_checksums', 'multiplefilefield_example.SimpleMultipleFileFieldModel', stdout=out)
+        self.assertIn("0 files verified, 0 mismatched, 0 missing, 0 unreadable.", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('verify_file_checksums', 'multiplefilefield_example.TestMultipleFile.name', stdout=StringIO())
+
+
+class ConvertLegacyFileValuesTestCase(TemporaryStorageMixin, TestCase):
+    def setUp(self):
+        super(ConvertLegacyFileValuesTestCase, self).setUp()
+        self.pks = []
+        for files in ["[u'a.txt', u'b.txt']", "['c.txt']", "d.txt", '["e.txt"]', ""]:
+            model = TestMultipleFile.objects.create(name="legacy")
+            TestMultipleFile.objects.filter(pk=model.pk).update(files=files)
+            self.pks.append(model.pk)
+
+    def get_values(self):
+        return list(TestMultipleFile.objects.order_by('pk').values_list('files', flat=True))
+
+    def test_convert(self):
+        """
+        Test legacy values are converted in batches
+        """
+        out = StringIO()
+        call_command('convert_legacy_file_values', 'multiplefilefield_example.TestMultipleFile',
+                     stdout=out, batch_size=2)
+        self.assertEqual(['["a.txt","b.txt"]', '["c.txt"]', '["d.txt"]', '["e.txt"]', ''], self.get_values())
+        self.assertIn("converted 2 rows up to pk=%s" % self.pks[1], out.getvalue())
+        self.assertIn("converted 1 rows up to pk=%s" % self.pks[3], out.getvalue())
+        self.assertIn("3 rows converted.", out.getvalue())
+
+        # The structured values read the same without the legacy parsing
+        self.field.legacy_values = False
+        model = TestMultipleFile.objects.get(pk=self.pks[0])
+        self.assertEqual(["a.txt", "b.txt"], [_file.name for _file in model.files])
+
+    def test_convert_repr(self):
+        """
+        Test names come back exactly from the repr() of the list
+        """
+        values = [u"[u'\\u6587\\u4ef6.txt']", u"[u'a, b.txt']", u"[u\"it's.txt\"]", u"[u'a\\\\b.txt']"]
+        TestMultipleFile.objects.all().delete()
+        for value in values:
+            model = TestMultipleFile.objects.create(name="legacy")
+            TestMultipleFile.objects.filter(pk=model.pk).update(files=value)
+
+        call_command('convert_legacy_file_values', 'multiplefilefield_example.TestMultipleFile', stdout=StringIO())
+        self.assertEqual([[u"\u6587\u4ef6.txt"], [u"a, b.txt"], [u"it's.txt"], [u"a\\b.txt"]],
+                         [json.loads(value) for value in self.get_values()])
+
+    def test_convert_single_update(self):
+        """
+        Test a batch is written by a single UPDATE
+        """
+        with CaptureQueriesContext(connection) as queries:
+            call_command('convert_legacy_file_values', 'multiplefilefield_example.TestMultipleFile',
+                         stdout=StringIO())
+        self.assertEqual(1, len([query for query in queries if 'UPDATE ' in query['sql']]))
+
+    def test_convert_changed_value(self):
+        """
+        Test values changed since they were read are left alone
+        """
+        TestMultipleFile.objects.filter(pk=self.pks[2]).update(files="f.txt")
+        converted = update_values(TestMultipleFile.objects, 'id', [
+            (self.pks[1], self.field, "['c.txt']", '["c.txt"]'),
+            (self.pks[2], self.field, "d.txt", '["d.txt"]'),
+        ])
+        self.assertEqual(1, converted)
+        self.assertEqual('["c.txt"]', TestMultipleFile.objects.get(pk=self.pks[1]).__dict__['files'])
+        self.assertEqual('f.txt', TestMultipleFile.objects.get(pk=self.pks[2]).__dict__['files'])
+
+    def test_convert_resume(self):
+        """
+        Test the conversion resumes after a primary key
+        """
+        call_command('convert_legacy_file_values', 'multiplefilefield_example.TestMultipleFile',
+                     stdout=StringIO(), start_after=self.pks[1])
+        self.assertEqual(["[u'a.txt', u'b.txt']", "['c.txt']", '["d.txt"]', '["e.txt"]', ''], self.get_values())
+
+    def test_operation(self):
+        """
+        Test the migration operation converts legacy values
+        """
+        operation = ConvertLegacyFileValues('TestMultipleFile', ['files'])
+        self.assertEqual(
+            ('ConvertLegacyFileValues', ('TestMultipleFile', ['files']), {}),
+            operation.deconstruct())
+        self.assertFalse(operation.reversible)
+
+        state = ProjectState.from_apps(apps)
+        with connection.schema_editor() as editor:
+            operation.database_forwards('multiplefilefield_example', editor, state, state)
+        self.assertEqual(['["a.txt","b.txt"]', '["c.txt"]', '["d.txt"]', '["e.txt"]', ''], self.get_values())
@@ -0,0 +1,192 @@
+import os
+from unittest import skipIf
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import router, transaction
+from django.test import TransactionTestCase
+from django.utils.six import StringIO
+
+from multiplefilefield import fields
+from multiplefilefield.deferred import _get_scopes, atomic_files
+from multiplefilefield.storage import RoutingStorage
+from multiplefilefield.tests import TemporaryStorageMixin
+from multiplefilefield_example.models import TestMultipleFile
+
+
+class FailingStorage(FileSystemStorage):
+    """
+    FileSystemStorage failing to write while failing is set
+    """
+    failing = False
+
+    def _save(self, name, content):
+        if self.failing:
+            raise IOError("Connection reset")
+        return super(FailingStorage, self)._save(name, content)
+
+
+class DeferredWritesTestCase(TemporaryStorageMixin, TransactionTestCase):
+    available_apps = ['multiplefilefield', 'multiplefilefield_example']
+
+    def setUp(self):
+        super(DeferredWritesTestCase, self).setUp()
+        self.staging_location = self.make_location()
+        self.field.staging_storage = FileSystemStorage(location=self.staging_location)
+        self.field.filename_strategy = 'uuid'
+        self.field.deferred_writes = True
+
+    def save_model(self):
+        model = TestMultipleFile(name="deferred")
+        model.files = [ContentFile(b"1", name="a.txt"), ContentFile(b"2", name="b.txt")]
+        model.save()
+        return model
+
+    def test_commit(self):
+        """
+        Test files reach the storage once the transaction commits
+        """
+        with atomic_files():
+            model = self.save_model()
+            names = [_file.name for _file in model.files]
+            self.assertEqual(2, len(os.listdir(self.staging_location)))
+            self.assertFalse(any(self.field.storage.exists(name) for name in names))
+
+        self.assertEqual([], os.listdir(self.staging_location))
+        model = TestMultipleFile.objects.get(pk=model.pk)
+        self.assertEqual(names, [_file.name for _file in model.files])
+        self.assertEqual([b"1", b"2"], [self.field.storage.open(name).read() for name in names])
+
+    def test_rollback(self):
+        """
+        Test staged files are deleted when the transaction rolls back
+        """
+        with self.assertRaises(ValueError):
+            with atomic_files():
+                self.save_model()
+                raise ValueError
+        self.assertEqual([], os.listdir(self.staging_location))
+        self.assertEqual([], os.listdir(self.location))
+        self.assertFalse(TestMultipleFile.objects.exists())
+
+    def test_nested_rollback(self):
+        """
+        Test files of a committed inner block are deleted when the outer block rolls back
+        """
+        with self.assertRaises(ValueError):
+            with atomic_files():
+                with atomic_files():
+                    self.save_model()
+                self.assertEqual(2, len(os.listdir(self.staging_location)))
+                raise ValueError
+        self.assertEqual([], os.listdir(self.staging_location))
+        self.assertEqual([], os.listdir(self.location))
+
+    def test_interrupted(self):
+        """
+        Test the block is left cleanly on exceptions outside of Exception
+        """
+        with self.assertRaises(KeyboardInterrupt):
+            with atomic_files():
+                self.save_model()
+                raise KeyboardInterrupt
+        self.assertEqual([], _get_scopes())
+        self.assertEqual([], os.listdir(self.staging_location))
+
+    @skipIf(hasattr(transaction, 'on_commit'), "Django 1.9+ defers the writes with on_commit()")
+    def test_nested_in_atomic(self):
+        """
+        Test atomic_files() refuses to write the files inside a transaction
+        """
+        with transaction.atomic():
+            with self.assertRaises(transaction.TransactionManagementError):
+                with atomic_files():
+                    pass
+        self.assertEqual([], _get_scopes())
+
+    def test_routing_storage(self):
+        """
+        Test files reach the backend recorded in their names
+        """
+        backends = dict((key, FileSystemStorage(location=os.path.join(self.location, key)))
+                        for key in ('hot', 'cold'))
+        self.field.storage = RoutingStorage(backends, router='size', size_threshold=10)
+        with atomic_files():
+            model = TestMultipleFile(name="deferred")
+            model.files = [ContentFile(b"1", name="a.txt"), ContentFile(b"2" * 20, name="b.txt")]
+            model.save()
+
+        model = TestMultipleFile.objects.get(pk=model.pk)
+        names = [_file.name for _file in model.files]
+        self.assertEqual(['hot', 'cold'], [name.split(':')[0] for name in names])
+        self.assertEqual([b"1", b"2" * 20], [self.field.storage.open(name).read() for name in names])
+        self.assertEqual([1, 1], [len(os.listdir(os.path.join(self.location, key, '.'))) for key in ('hot', 'cold')])
+
+    def test_database(self):
+        """
+        Test writes wait for the database the instance is saved to
+        """
+        databases = []
+        stage_write = fields.stage_write
+        fields.stage_write = lambda write, using: databases.append(using) or stage_write(write, using)
+        self.addCleanup(setattr, fields, 'stage_write', stage_write)
+        router.db_for_write = lambda *args, **kwargs: 'other'
+        self.addCleanup(delattr, router, 'db_for_write')
+
+        model = TestMultipleFile(name="deferred")
+        model.files = [ContentFile(b"1", name="a.txt")]
+        model.save(using='default')
+        self.assertEqual(['default'], databases)
+
+    def test_check(self):
+        """
+        Test deferred writes require collision-free names
+        """
+        self.assertEqual([], [error for error in self.field.check() if error.id == 'multiplefilefield.E003'])
+        self.field.filename_strategy = None
+        self.assertEqual(['multiplefilefield.E003'],
+                         [error.id for error in self.field.check() if error.id == 'multiplefilefield.E003'])
+
+    def test_retry_staged_writes(self):
+        """
+        Test failed writes are kept by the purge and written by the retry
+        """
+        self.field.storage = FailingStorage(location=self.location)
+        self.field.storage.failing = True
+        model = self.save_model()
+        names = [_file.name for _file in model.files]
+        self.assertEqual([], os.listdir(self.location))
+
+        for name in os.listdir(self.staging_location):
+            os.utime(os.path.join(self.staging_location, name), (0, 0))
+        out = StringIO()
+        call_command('purge_staged_files', 'multiplefilefield_example', stdout=out)
+        self.assertIn("0 staged files deleted.", out.getvalue())
+        self.assertEqual(4, len(os.listdir(self.staging_location)))
+
+        with self.assertRaises(CommandError):
+            call_command('retry_staged_writes', 'multiplefilefield_example', stdout=StringIO())
+        self.assertEqual(4, len(os.listdir(self.staging_location)))
+
+        self.field.storage.failing = False
+        out = StringIO()
+        call_command('retry_staged_writes', 'multiplefilefield_example', stdout=out)
+        self.assertIn("2 staged files written, 0 failed.", out.getvalue())
+        self.assertEqual([], os.listdir(self.staging_location))
+        self.assertEqual([b"1", b"2"], [self.field.storage.open(name).read() for name in names])
+
+    def test_purge_staged_files(self):
+        """
+        Test old staged files are purged
+        """
+        self.field.staging_storage.save('old/a.txt', ContentFile(b"1"))
+        os.utime(os.path.join(self.staging_location, 'old', 'a.txt'), (0, 0))
+        self.field.staging_storage.save('b.txt', ContentFile(b"2"))
+
+        out = StringIO()
+        call_command('purge_staged_files', 'multiplefilefield_example', stdout=out)
+        self.assertIn("1 staged files deleted.", out.getvalue())
+        self.assertFalse(self.field.staging_storage.exists('old/a.txt'))
+        self.assertTrue(self.field.staging_storage.exists('b.txt'))
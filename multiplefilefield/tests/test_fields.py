@@ -0,0 +1,120 @@
+import os
+import threading
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from multiplefilefield.fields import _directory_names
+from multiplefilefield.tests import TemporaryStorageMixin
+from multiplefilefield_example.models import TestMultipleFile
+
+
+class ProbeCountingStorage(FileSystemStorage):
+    """
+    FileSystemStorage which counts its existence probes
+    """
+    def __init__(self, *args, **kwargs):
+        super(ProbeCountingStorage, self).__init__(*args, **kwargs)
+        self.exists_calls = 0
+
+    def exists(self, name):
+        self.exists_calls += 1
+        return super(ProbeCountingStorage, self).exists(name)
+
+
+class MultipleFileModelFieldTestCase(TemporaryStorageMixin, TestCase):
+    storage_class = ProbeCountingStorage
+
+    def test_save_default_names(self):
+        """
+        Test same-named uploads are renamed by the storage
+        """
+        model = TestMultipleFile(name="default")
+        model.files = [ContentFile(b"1", name="image.jpg"), ContentFile(b"2", name="image.jpg")]
+        model.save()
+
+        names = [_file.name for _file in TestMultipleFile.objects.get(pk=model.pk).files]
+        self.assertEqual(2, len(set(names)))
+        self.assertIn("./image.jpg", names)
+        self.assertTrue(self.field.storage.exists_calls > 0)
+
+    def test_save_uuid_names(self):
+        """
+        Test uuid names skip the storage existence probes
+        """
+        self.field.filename_strategy = 'uuid'
+        model = TestMultipleFile(name="uuid")
+        model.files = [ContentFile(b"1", name="image.jpg"), ContentFile(b"2", name="image.jpg")]
+        model.save()
+
+        names = [_file.name for _file in TestMultipleFile.objects.get(pk=model.pk).files]
+        self.assertEqual(2, len(set(names)))
+        for name in names:
+            self.assertTrue(name.endswith(".jpg"))
+            self.assertNotEqual("./image.jpg", name)
+        self.assertEqual(0, self.field.storage.exists_calls)
+
+    def test_save_uuid_names_max_length(self):
+        """
+        Test uuid names longer than the column are refused before the write
+        """
+        self.field.filename_strategy = 'uuid'
+        self.field.upload_to = 'd' * 70
+        model = TestMultipleFile(name="uuid")
+        model.files = [ContentFile(b"1", name="image.jpg")]
+        with self.assertRaises(SuspiciousFileOperation):
+            model.save()
+        self.assertEqual([], os.listdir(self.location))
+
+    def test_check_filename_strategy(self):
+        """
+        Test unknown strategies are reported
+        """
+        self.field.filename_strategy = 'hash'
+        self.assertEqual(['multiplefilefield.E001'],
+                         [error.id for error in self.field.check() if error.id == 'multiplefilefield.E001'])
+
+    def test_directory_name_per_batch(self):
+        """
+        Test the upload directory is resolved once per save batch
+        """
+        calls = []
+        get_directory_name = self.field.get_directory_name
+
+        def counting_get_directory_name():
+            calls.append(getattr(_directory_names, 'by_field', {}).get(id(self.field)))
+            return get_directory_name()
+        self.field.get_directory_name = counting_get_directory_name
+        model = TestMultipleFile(name="batch")
+        model.files = [ContentFile(b"1", name="a.txt"), ContentFile(b"2", name="b.txt")]
+        model.save()
+        # Computed once in pre_save, then served from the cache
+        self.assertEqual([None, '.', '.'], calls)
+
+    def test_directory_name_per_thread(self):
+        """
+        Test the upload directory of a batch is not shared with other threads
+        """
+        self.field.set_batch_directory_name('batch')
+        try:
+            directory_names = []
+            thread = threading.Thread(target=lambda: directory_names.append(self.field.get_directory_name()))
+            thread.start()
+            thread.join()
+            self.assertEqual(['.'], directory_names)
+            self.assertEqual('batch', self.field.get_directory_name())
+        finally:
+            self.field.set_batch_directory_name(None)
+        self.assertEqual('.', self.field.get_directory_name())
+
+    def test_non_ascii_names(self):
+        """
+        Test non-ASCII names are stored without escapes
+        """
+        value = self.field.get_prep_value([u"./\u6587\u4ef6.txt"])
+        self.assertEqual(u'["./\u6587\u4ef6.txt"]', value)
+
+        model = TestMultipleFile(name="non_ascii", files=value)
+        self.assertEqual(u"./\u6587\u4ef6.txt", model.files[0].name)
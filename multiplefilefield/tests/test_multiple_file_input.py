@@ -156,6 +156,20 @@ class MultipleFileInputTestCase(TestCase):
         file_link_tags = labels.find_all("a")
         self.assertEqual(0, len(file_link_tags))
 
+    def test_admin_file_input_render_without_links(self):
+        """
+        Test File Input renderer with the count only
+        """
+        model_normal = TestMultipleFile(name="input", files="[u'something.txt', u'else.txt', u'something_else.txt']")
+        _input = MultipleFileInput(links=False)
+
+        html = _input.render("input_name", model_normal.files)
+        labels = bs(html, "html.parser")
+
+        self.assertIsNotNone(labels.find("input"))
+        self.assertIn("Count : 3", labels.get_text())
+        self.assertEqual(0, len(labels.find_all("a")))
+
     def tearDown(self):
         pass
 
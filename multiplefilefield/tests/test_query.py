@@ -0,0 +1,191 @@
+import pickle
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from multiplefilefield.fields import FieldFile, ReadOnlyFieldFile
+from multiplefilefield.tests import TemporaryStorageMixin
+from multiplefilefield_example.models import TestMultipleFile
+
+
+class CallCountingStorage(FileSystemStorage):
+    """
+    FileSystemStorage which counts its metadata calls
+    """
+    def __init__(self, *args, **kwargs):
+        super(CallCountingStorage, self).__init__(*args, **kwargs)
+        self.calls = []
+
+    def size(self, name):
+        self.calls.append(('size', name))
+        return super(CallCountingStorage, self).size(name)
+
+    def url(self, name):
+        self.calls.append(('url', name))
+        return super(CallCountingStorage, self).url(name)
+
+
+class BatchMetadataStorage(CallCountingStorage):
+    """
+    Storage answering metadata for a whole directory at once
+    """
+    def get_metadata(self, path, names):
+        self.calls.append(('get_metadata', path))
+        return dict((name, {'size': 42, 'url': '/batch/' + name}) for name in names)
+
+
+class PrefetchFileMetadataTestCase(TemporaryStorageMixin, TestCase):
+    storage_class = CallCountingStorage
+
+    def setUp(self):
+        super(PrefetchFileMetadataTestCase, self).setUp()
+        for i in range(3):
+            model = TestMultipleFile(name=str(i))
+            model.files = [ContentFile(b"12345", name="a.txt"), ContentFile(b"123", name="b.txt")]
+            model.save()
+
+    def test_prefetch_file_metadata(self):
+        """
+        Test sizes and urls are served from the prefetched metadata
+        """
+        self.field.storage.calls = []
+        models = list(TestMultipleFile.objects.order_by('pk').prefetch_file_metadata('files'))
+        self.assertEqual(12, len(self.field.storage.calls))
+
+        self.field.storage.calls = []
+        for model in models:
+            self.assertEqual([5, 3], [_file.size for _file in model.files])
+            for _file in model.files:
+                self.assertEqual('/media/' + _file.name.lstrip('./'), _file.url)
+        self.assertEqual([], self.field.storage.calls)
+
+    def test_prefetch_file_metadata_batch(self):
+        """
+        Test storages with get_metadata() are queried once per directory
+        """
+        self.field.storage = BatchMetadataStorage(location=self.location)
+        models = list(TestMultipleFile.objects.prefetch_file_metadata('files'))
+        self.assertEqual([('get_metadata', '.')], self.field.storage.calls)
+        for model in models:
+            for _file in model.files:
+                self.assertEqual(42, _file.size)
+                self.assertEqual('/batch/' + _file.name, _file.url)
+        self.assertEqual(1, len(self.field.storage.calls))
+
+    def test_without_prefetch(self):
+        """
+        Test sizes still come from the storage without prefetching
+        """
+        model = TestMultipleFile.objects.order_by('pk').first()
+        self.field.storage.calls = []
+        self.assertEqual(5, model.files[0].size)
+        self.assertEqual([('size', model.files[0].name)], self.field.storage.calls)
+
+
+class ReadOnlyFilesTestCase(TemporaryStorageMixin, TestCase):
+    storage_class = CallCountingStorage
+
+    def setUp(self):
+        super(ReadOnlyFilesTestCase, self).setUp()
+        model = TestMultipleFile(name="read_only")
+        model.files = [ContentFile(b"12345", name="a.txt"), ContentFile(b"123", name="b.txt")]
+        model.save()
+
+    def test_read_only_files(self):
+        """
+        Test read-only files are slim handles
+        """
+        model = TestMultipleFile.objects.read_only_files('files').get()
+        self.assertEqual(2, len(model.files))
+        for _file in model.files:
+            self.assertIsInstance(_file, ReadOnlyFieldFile)
+            self.assertFalse(hasattr(_file, '__dict__'))
+        self.assertIn("./a.txt", model.files)
+        self.assertEqual(5, model.files[0].size)
+        self.assertEqual('/media/a.txt', model.files[0].url)
+
+    def test_read_only_files_prefetch(self):
+        """
+        Test read-only files take prefetched metadata
+        """
+        model = TestMultipleFile.objects.read_only_files('files').prefetch_file_metadata('files').get()
+        self.field.storage.calls = []
+        self.assertEqual([5, 3], [_file.size for _file in model.files])
+        self.assertEqual([], self.field.storage.calls)
+
+    def test_read_only_files_upgrade(self):
+        """
+        Test opening a read-only file upgrades it to a FieldFile
+        """
+        model = TestMultipleFile.objects.read_only_files('files').get()
+        handle = model.files[0]
+        handle.open()
+        self.assertEqual(b"12345", handle.read())
+
+        _file = model.files[0]
+        self.assertIsInstance(_file, FieldFile)
+        self.assertFalse(_file.closed)
+        _file.close()
+        self.assertIsInstance(model.files[1], ReadOnlyFieldFile)
+
+    def test_read_only_files_save(self):
+        """
+        Test saving keeps the read-only files
+        """
+        model = TestMultipleFile.objects.read_only_files('files').get()
+        model.name = "renamed"
+        model.save()
+
+        model = TestMultipleFile.objects.get()
+        self.assertEqual("renamed", model.name)
+        self.assertEqual(["./a.txt", "./b.txt"], [_file.name for _file in model.files])
+
+
+class PickleFilesTestCase(TemporaryStorageMixin, TestCase):
+    storage_class = CallCountingStorage
+
+    def setUp(self):
+        super(PickleFilesTestCase, self).setUp()
+        model = TestMultipleFile(name="pickle")
+        model.files = [ContentFile(b"12345", name="a.txt"), ContentFile(b"123", name="b.txt")]
+        model.save()
+
+    def assertFilesRestored(self, model):
+        self.field.storage.calls = []
+        self.assertEqual(["./a.txt", "./b.txt"], [_file.name for _file in model.files])
+        for _file in model.files:
+            self.assertIs(model, _file.instance)
+            self.assertIs(self.field, _file.field)
+        self.assertEqual([5, 3], [_file.size for _file in model.files])
+        self.assertEqual(['/media/a.txt', '/media/b.txt'], [_file.url for _file in model.files])
+        self.assertEqual([], self.field.storage.calls)
+
+    def test_pickle_files(self):
+        """
+        Test files and their metadata survive pickling
+        """
+        model = TestMultipleFile.objects.prefetch_file_metadata('files').get()
+        model = pickle.loads(pickle.dumps(model, pickle.HIGHEST_PROTOCOL))
+        self.assertFilesRestored(model)
+        self.assertIsInstance(model.files[0], FieldFile)
+
+    def test_pickle_read_only_files(self):
+        """
+        Test read-only files survive pickling
+        """
+        model = TestMultipleFile.objects.read_only_files('files').prefetch_file_metadata('files').get()
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            restored = pickle.loads(pickle.dumps(model, protocol))
+            self.assertFilesRestored(restored)
+            self.assertIsInstance(restored.files[0], ReadOnlyFieldFile)
+
+    def test_cache_queryset(self):
+        """
+        Test a fetched queryset round-trips through the cache
+        """
+        cache.set('files', list(TestMultipleFile.objects.prefetch_file_metadata('files')))
+        models = cache.get('files')
+        self.assertEqual(1, len(models))
+        self.assertFilesRestored(models[0])
@@ -0,0 +1,95 @@
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from multiplefilefield.storage import RoutingStorage
+from multiplefilefield.tests import TemporaryStorageMixin
+from multiplefilefield_example.models import TestMultipleFile
+
+
+def route_by_extension(storage, name, content):
+    return 'text' if name.endswith('.txt') else 'other'
+
+
+class RoutingStorageTestCase(TemporaryStorageMixin, TestCase):
+    def setUp(self):
+        super(RoutingStorageTestCase, self).setUp()
+        self.locations = dict((key, self.make_location()) for key in ('hot', 'cold'))
+        self.backends = dict((key, FileSystemStorage(location=location, base_url='/%s/' % key))
+                             for key, location in self.locations.items())
+
+    def save_model(self, files):
+        model = TestMultipleFile(name="routing")
+        model.files = files
+        model.save()
+        return TestMultipleFile.objects.get(pk=model.pk)
+
+    def test_route_by_hash(self):
+        """
+        Test files are spread over the backends by name
+        """
+        self.field.storage = RoutingStorage(self.backends)
+        model = self.save_model([ContentFile(str(i).encode(), name="%d.txt" % i) for i in range(20)])
+
+        self.assertEqual(20, len(model.files))
+        keys = set()
+        for i, _file in enumerate(model.files):
+            key, name = _file.name.split(':', 1)
+            keys.add(key)
+            self.assertEqual("./%d.txt" % i, name)
+            self.assertTrue(os.path.exists(os.path.join(self.locations[key], name)))
+            self.assertEqual(str(i).encode(), _file.storage.open(_file.name).read())
+            self.assertEqual('/%s/%d.txt' % (key, i), _file.url)
+        self.assertEqual({'hot', 'cold'}, keys)
+
+    def test_route_by_size(self):
+        """
+        Test small files go to the hot backend and large ones to the cold one
+        """
+        self.field.storage = RoutingStorage(self.backends, router='size', size_threshold=10)
+        self.field.filename_strategy = 'uuid'
+        model = self.save_model([ContentFile(b"small", name="a.txt"), ContentFile(b"x" * 100, name="b.txt")])
+
+        self.assertTrue(model.files[0].name.startswith('hot:'))
+        self.assertTrue(model.files[1].name.startswith('cold:'))
+        self.assertEqual([5, 100], [_file.size for _file in model.files])
+
+        model.files[0].delete(save=False)
+        self.assertEqual([], os.listdir(self.locations['hot']))
+
+    def test_route_by_callable(self):
+        """
+        Test a callable router and names from before the routing
+        """
+        backends = {'text': self.backends['hot'], 'other': self.backends['cold']}
+        self.field.storage = RoutingStorage(backends, router=route_by_extension, default='other')
+        model = self.save_model([ContentFile(b"1", name="a.txt"), ContentFile(b"2", name="b.bin")])
+        self.assertEqual(["text:./a.txt", "other:./b.bin"], [_file.name for _file in model.files])
+
+        # Names without a key are in the default backend
+        self.assertTrue(self.field.storage.exists("./b.bin"))
+        self.assertFalse(self.field.storage.exists("./a.txt"))
+
+    def test_max_length(self):
+        """
+        Test the key counts against the max_length of the name
+        """
+        storage = RoutingStorage({'text': self.backends['hot']}, router=route_by_extension)
+        storage.save("abcdefghijkl.txt", ContentFile(b"1"), max_length=20)
+        name = storage.save("abcdefghijkl.txt", ContentFile(b"2"), max_length=20)
+        self.assertTrue(name.startswith('text:'))
+        self.assertTrue(len(name) <= 20)
+        self.assertEqual(b"2", storage.open(name).read())
+
+    def test_prefetch_file_metadata(self):
+        """
+        Test metadata is fetched from every backend
+        """
+        self.field.storage = RoutingStorage(self.backends)
+        self.save_model([ContentFile(b"1" * i, name="%d.txt" % i) for i in range(1, 6)])
+        model = TestMultipleFile.objects.prefetch_file_metadata('files').get()
+        self.assertEqual([1, 2, 3, 4, 5], [_file._size for _file in model.files])
+        self.assertEqual([_file.storage.url(_file.name) for _file in model.files],
+                         [_file._url for _file in model.files])
@@ -0,0 +1,58 @@
+from multiprocessing.pool import ThreadPool
+
+from django.apps import apps
+from django.conf import settings
+
+
+def get_max_workers():
+    return getattr(settings, 'MULTIPLEFILEFIELD_MAX_WORKERS', 8)
+
+
+def thread_map(func, items, max_workers=None):
+    """
+    Maps func over items in a pool of threads, for storage calls which are
+    I/O bound. Results keep the order of items.
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = get_max_workers()
+    workers = min(max_workers, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_label(field):
+    """Returns the label of field, app_label.Model.field, as get_fields() takes it."""
+    return '%s.%s.%s' % (field.model._meta.app_label, field.model._meta.object_name, field.name)
+
+
+def get_fields(labels):
+    """
+    Returns the MultipleFileModelFields designated by labels, in the form
+    app_label, app_label.Model or app_label.Model.field, or all of them.
+    """
+    from multiplefilefield.fields import MultipleFileModelField
+
+    fields = []
+    for label in labels or [None]:
+        parts = label.split('.') if label else []
+        if len(parts) > 1:
+            models = [apps.get_model(parts[0], parts[1])]
+        elif parts:
+            models = apps.get_app_config(parts[0]).get_models()
+        else:
+            models = apps.get_models()
+        for model in models:
+            for field in model._meta.fields:
+                if isinstance(field, MultipleFileModelField) and (len(parts) < 3 or field.name == parts[2]):
+                    fields.append(field)
+    if not fields:
+        raise LookupError("No MultipleFileModelField found for %s." % (', '.join(labels) or 'any model'))
+    return fields
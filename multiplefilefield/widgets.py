@@ -25,6 +25,12 @@ class MultipleFileInput(Widget):
         'Multiple files possible'
     )
 
+    def __init__(self, attrs=None, links=True):
+        # Without links, only the count of the files is rendered, which
+        # spares computing their urls
+        super(MultipleFileInput, self).__init__(attrs)
+        self.links = links
+
     def render(self, name, value, attrs=None):
         # Add file input multiple attribute before render
         if attrs:
@@ -42,14 +48,18 @@ class MultipleFileInput(Widget):
         if value:
             template_temp += '<ol>'
             for _file in value:
-                if isinstance(_file, multiplefilefield.fields.FieldFile):
+                if isinstance(_file, (multiplefilefield.fields.FieldFile,
+                                      multiplefilefield.fields.ReadOnlyFieldFile)):
                     # If not FieldFile, it is not from database
                     counter += 1
-                    file_info = {"initial_url": _file.url, "initial": _file}
-                    template_temp += (self.template_item % file_info)
+                    if self.links:
+                        file_info = {"initial_url": _file.url, "initial": _file}
+                        template_temp += (self.template_item % file_info)
                 else:
                     return format_html('<input{} />' + str(self.multiple_tip), flatatt(attrs))
             template_temp += '</ol>'
+            if not self.links:
+                template_temp = ''
         else:
             return format_html('<input{} />' + str(self.multiple_tip), flatatt(attrs))
 
@@ -1,9 +1,16 @@
 from django.contrib import admin
 
+from multiplefilefield.admin import MultipleFileModelAdmin, file_summary
 from multiplefilefield_example.models import SimpleMultipleFileFieldModel,\
     MultipleMultipleFileFieldModel
 
 
+class MultipleMultipleFileFieldModelAdmin(MultipleFileModelAdmin):
+    list_display = ('hash', file_summary('files_1'), file_summary('files_2'), file_summary('files_3'),
+                    file_summary('files_4'), file_summary('files_5'))
+    file_links = False
+
+
 # Register your models here.
 admin.site.register(SimpleMultipleFileFieldModel)
-admin.site.register(MultipleMultipleFileFieldModel)
+admin.site.register(MultipleMultipleFileFieldModel, MultipleMultipleFileFieldModelAdmin)
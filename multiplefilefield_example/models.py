@@ -1,5 +1,6 @@
 from django.db import models
 from multiplefilefield.fields import MultipleFileModelField
+from multiplefilefield.query import MultipleFileQuerySet
 
 
 # Create your models here.
@@ -16,7 +17,11 @@ class MultipleMultipleFileFieldModel(models.Model):
     files_4 = MultipleFileModelField()
     files_5 = MultipleFileModelField()
 
+    objects = MultipleFileQuerySet.as_manager()
+
 
 class TestMultipleFile(models.Model):
     name = models.CharField(null=False, blank=False, max_length=128)
     files = MultipleFileModelField()
+
+    objects = MultipleFileQuerySet.as_manager()